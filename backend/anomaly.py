@@ -0,0 +1,270 @@
+"""
+Streaming Anomaly & Drift Detection — QuantumTrio
+Per-restaurant and per-city EWMA + two-sided CUSUM state over for_bias,
+prep_gap and true_kpt, updated in O(1) per order.
+
+Orders are fed in batches (the whole load at startup, or any smaller batch
+later: state carries over between calls). A batch is taken in confirm_time
+order and grouped by key, and each key's values run through one tight loop
+per signal, so the per-order cost is a handful of float operations.
+
+Restaurants are updated per order. Cities see far more traffic, so the
+detector steps once per CITY_BATCH orders on the batch mean (batch-means
+CUSUM): same drift sensitivity, less noise and a fraction of the cost.
+
+  z          = (x - ewma_mean) / ewma_std
+  true_kpt z > SPIKE_Z   → rush spike
+  z clipped to ±SPIKE_Z  (a lone outlier cannot cross H or drag the baseline)
+  cusum_up   = max(0, cusum_up   + z - K)
+  cusum_down = max(0, cusum_down - z - K)
+  cusum_* > H            → change point (baseline re-learns the new level)
+
+An alert stays active until its signal has been in control for
+CLEAR_AFTER further orders. Events are applied in confirm_time order.
+Recent change points and rush spikes are kept in separate bounded ring
+buffers, so a burst of spikes cannot evict the change points, for the
+/api/anomalies endpoint.
+"""
+
+import math
+import threading
+from collections import deque
+from operator import itemgetter, mul
+
+# (name, order field)
+SIGNALS = (
+    ("for_bias", "for_bias_minutes"),
+    ("prep_gap", "prep_gap_minutes"),
+    ("true_kpt", "true_kpt_minutes"),
+)
+
+ALPHA       = 0.05   # EWMA smoothing
+K           = 0.5    # CUSUM slack (in std units)
+H           = 8.0    # CUSUM decision threshold
+WARMUP      = 20     # observations before a key can alert (also after each change point)
+SPIKE_Z     = 4.0    # true_kpt z-score flagged as a rush spike; also the CUSUM input clip
+MIN_STD     = 0.5    # minutes; floor so near-constant signals don't alert on noise
+CLEAR_AFTER = 50     # in-control observations before an alert is cleared
+CITY_BATCH  = 16     # orders per city-level detector step
+MAX_EVENTS  = 500    # per event kind
+
+_TRUE_KPT = len(SIGNALS) - 1
+_BY_TIME  = itemgetter("confirm_time")
+
+
+def _new_state():
+    # per signal: [n, ewma_mean, ewma_var, cusum_up, cusum_down, quiet (-1 = no alert)]
+    return [[0, 0.0, 0.0, 0.0, 0.0, -1] for _ in SIGNALS]
+
+
+class AnomalyDetector:
+    """
+    One small list of per-signal state per restaurant and per city. Events
+    (change points, spikes, clears) are the only slow path; they are
+    collected while scanning and applied in time order at the end.
+    """
+
+    def __init__(self):
+        self._state  = {"restaurant": {}, "city": {}}
+        self._city_batch = {}      # city -> [count, sum for_bias, sum prep_gap, sum true_kpt]
+        self._active = {}          # (scope, key, signal) -> alert dict, oldest first
+        self._events = {"change_point": deque(maxlen=MAX_EVENTS), "rush_spike": deque(maxlen=MAX_EVENTS)}
+        self._lock   = threading.Lock()
+        self.observed = 0
+
+    def observe(self, orders, city_of):
+        """
+        Feed a batch of enriched orders (any order; taken by confirm_time).
+        `city_of(order)` is called once per restaurant in the batch.
+        """
+        # one time-ordered pass: per-restaurant series, and city batch means
+        # summed on the fly (partial batches carry over to the next call)
+        by_rest, by_city = {}, {}
+        for o in sorted(orders, key=_BY_TIME):
+            series = by_rest.get(o["restaurant_id"])
+            if series is None:
+                city = city_of(o)
+                if city not in by_city:
+                    by_city[city] = ([], [], [], [])
+                    self._city_batch.setdefault(city, [0, 0.0, 0.0, 0.0])
+                series = by_rest[o["restaurant_id"]] = ([], [], [], [], self._city_batch[city], by_city[city])
+            fb, pg, tk = o["for_bias_minutes"], o["prep_gap_minutes"], o["true_kpt_minutes"]
+            series[0].append(fb)
+            series[1].append(pg)
+            series[2].append(tk)
+            series[3].append(o)
+            acc = series[4]
+            n = acc[0] + 1
+            if n < CITY_BATCH:
+                acc[0] = n
+                acc[1] += fb
+                acc[2] += pg
+                acc[3] += tk
+                continue
+            steps = series[5]
+            steps[0].append((acc[1] + fb) / n)
+            steps[1].append((acc[2] + pg) / n)
+            steps[2].append((acc[3] + tk) / n)
+            # events on a city step point at the order that closed the batch
+            steps[3].append(o)
+            acc[0] = 0
+            acc[1] = acc[2] = acc[3] = 0.0
+
+        events = []
+        states = self._state["restaurant"]
+        for rid, series in by_rest.items():
+            st = states.get(rid)
+            if st is None:
+                st = states[rid] = _new_state()
+            for i in range(len(SIGNALS)):
+                self._scan(st[i], series[i], series[3], "restaurant", rid, i, events)
+
+        states = self._state["city"]
+        for city, steps in by_city.items():
+            if not steps[3]:
+                continue
+            st = states.get(city)
+            if st is None:
+                st = states[city] = _new_state()
+            for i in range(len(SIGNALS)):
+                self._scan(st[i], steps[i], steps[3], "city", city, i, events)
+
+        self.observed += len(orders)
+        events.sort(key=itemgetter(0))
+        with self._lock:
+            for _, ev, alert in events:
+                self._active.pop(alert, None)
+                if ev is not None:
+                    self._events[ev["kind"]].append(ev)
+                    # re-insert so _active stays ordered by most recent alert
+                    self._active[alert] = ev
+
+    def _scan(self, s, values, orders, scope, key, sig_idx, events,
+              sqrt=math.sqrt, warmup=WARMUP, alpha=ALPHA, k=K, h=H, min_std=MIN_STD, spike_z=SPIKE_Z,
+              clear_after=CLEAR_AFTER, var_decay=1 - ALPHA, var_gain=ALPHA * (1 - ALPHA)):
+        # one key, one signal: state lives in locals and constants are bound as
+        # defaults, since this loop body runs once per order per signal
+        n, mean, var, up, down, quiet = s
+        if n < warmup and values:
+            # warm-up is a plain mean / variance: fold the whole block in at once
+            # (Chan et al. combine with the running state)
+            m = min(warmup - n, len(values))
+            block = values[:m]
+            b_mean = sum(block) / m
+            b_var = max(sum(map(mul, block, block)) / m - b_mean * b_mean, 0.0)
+            total = n + m
+            delta = b_mean - mean
+            mean += delta * m / total
+            var = (var * n + b_var * m + delta * delta * n * m / total) / total
+            n = total
+            values, orders = values[m:], orders[m:]
+        std = max(sqrt(var), min_std)
+        spikes = sig_idx == _TRUE_KPT
+        for x, o in zip(values, orders):
+            d = x - mean
+            if n < warmup:
+                # plain running mean / variance until the EWMA has something to anchor on
+                n += 1
+                mean += d / n
+                var += (d * (x - mean) - var) / n
+                if n == warmup:
+                    std = max(sqrt(var), min_std)
+                continue
+            if quiet >= 0:
+                # count in-control orders since the last alert on this signal
+                quiet += 1
+                if quiet == clear_after:
+                    events.append((o["confirm_time"], None, (scope, key, SIGNALS[sig_idx][0])))
+                    quiet = -1
+            z = d / std
+            if z > spike_z or z < -spike_z:
+                if spikes and z > 0.0:
+                    events.append(self._event("rush_spike", scope, key, sig_idx, mean, x, o,
+                                              z_score=round(z, 2), load_index=o.get("load_index")))
+                    quiet = 0
+                z = spike_z if z > 0.0 else -spike_z
+                d = z * std
+            up += z - k
+            down -= z + k
+            if up > h or down > h:
+                events.append(self._event("change_point", scope, key, sig_idx, mean, x, o,
+                                          direction="up" if up > h else "down", shift=round(x - mean, 2)))
+                # restart the warm-up so the baseline re-learns the new level
+                n, var, up, down, quiet = 0, 0.0, 0.0, 0.0, 0
+                continue
+            if up < 0.0:
+                up = 0.0
+            if down < 0.0:
+                down = 0.0
+            mean += alpha * d
+            var = var_decay * var + var_gain * d * d
+            std = sqrt(var)
+            if std < min_std:
+                std = min_std
+        s[:] = (n, mean, var, up, down, quiet)
+
+    # ── Events (rare path) ────────────────────────────────────
+    def _event(self, kind, scope, key, sig_idx, baseline, value, order, **extra):
+        """(confirm_time, event, active-alert key) for observe() to apply in time order"""
+        signal = SIGNALS[sig_idx][0]
+        ev = {
+            "kind":          kind,
+            "scope":         scope,
+            "key":           key,
+            "signal":        signal,
+            "baseline":      round(baseline, 2),
+            "value":         round(value, 2),
+            "order_id":      order["order_id"],
+            "restaurant_id": order["restaurant_id"],
+            "confirm_time":  order["confirm_time"],
+            **extra,
+        }
+        return order["confirm_time"], ev, (scope, key, signal)
+
+    # ── Reads ─────────────────────────────────────────────────
+    def active_alerts(self, scope=None, key=None):
+        """Newest first"""
+        with self._lock:
+            alerts = list(self._active.values())
+        return [a for a in reversed(alerts) if (scope is None or a["scope"] == scope) and (key is None or a["key"] == key)]
+
+    def recent_events(self, scope=None, key=None, kind=None, limit=50):
+        """Newest first; filter by scope / key / kind ("change_point" or "rush_spike")"""
+        with self._lock:
+            if kind is None:
+                events = sorted((e for q in self._events.values() for e in q), key=lambda e: e["confirm_time"])
+            else:
+                events = list(self._events[kind])
+        events = [
+            e for e in reversed(events)
+            if (scope is None or e["scope"] == scope) and (key is None or e["key"] == key)
+        ]
+        return events[:limit]
+
+    def baseline(self, scope, key):
+        """Current EWMA mean / std per signal for a key (None if unseen)"""
+        st = self._state.get(scope, {}).get(key)
+        if st is None:
+            return None
+        return {
+            name: {
+                "warmed_up":    s[0] >= WARMUP,
+                "ewma_mean":    round(s[1], 2),
+                "ewma_std":     round(s[2] ** 0.5, 2),
+            }
+            for (name, _), s in zip(SIGNALS, st)
+        }
+
+    def summary(self):
+        with self._lock:
+            active        = len(self._active)
+            change_points = len(self._events["change_point"])
+            rush_spikes   = len(self._events["rush_spike"])
+        return {
+            "orders_observed":   self.observed,
+            "tracked_keys":      sum(len(v) for v in self._state.values()),
+            "active_alerts":     active,
+            "recent_events":     change_points + rush_spikes,
+            "change_points":     change_points,
+            "rush_spikes":       rush_spikes,
+        }
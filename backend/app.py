@@ -14,6 +14,12 @@ from flask import Flask, jsonify, request, send_from_directory
 from collections import defaultdict
 import statistics
 
+from mongo_connector import get_mongo_manager, ALLOW_SYNTHETIC_FALLBACK
+from pushdown import run_pushdown_analytics, check_parity
+from catalog import RestaurantCatalog, footprint_report
+from kpt_matrix import KptMatrix
+from anomaly import AnomalyDetector
+
 # ── Load .env file ────────────────────────────────────────────
 try:
     from dotenv import load_dotenv
@@ -43,9 +49,19 @@ CITIES = {
 }
 DEFAULT_CITY = {"tier": 2, "density": 0.60, "congestion_base": 0.50}
 
+# Re-run the rollups as MongoDB aggregation pipelines and compare (diagnostic)
+ANALYTICS_PARITY_CHECK = os.environ.get("ANALYTICS_PARITY_CHECK", "false").lower() in ("1", "true", "yes")
+
+# Restaurant dicts kept (as loaded) to report the old dict layout's footprint
+FOOTPRINT_SAMPLE = 2000
+
+# Streaming CUSUM/EWMA stage fed with the enriched orders in confirm_time order
+ANOMALY_DETECTION = os.environ.get("ANOMALY_DETECTION", "true").lower() in ("1", "true", "yes")
+ANOMALY_DETECTOR  = AnomalyDetector() if ANOMALY_DETECTION else None
+
 MONGO_URL = os.environ.get("MONGO_URL", "")
-if not MONGO_URL:
-    raise RuntimeError("MONGO_URL is not set. Add it to your .env file.")
+if not MONGO_URL and not ALLOW_SYNTHETIC_FALLBACK:
+    raise RuntimeError("MONGO_URL is not set. Add it to your .env file (or set ALLOW_SYNTHETIC_FALLBACK=true).")
 
 def parse_dt(val):
     if val is None:
@@ -76,20 +92,20 @@ def classify_bias(for_bias, prep_gap):
 
 def load_from_mongodb():
     try:
-        from pymongo import MongoClient
         print("Connecting to MongoDB...")
-        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=8000)
-        client.admin.command("ping")
-        db = client["zomathon"]
+        mongo = get_mongo_manager()
+        mongo.client()
 
         print("   Loading restaurant-data...")
-        raw_rests = list(db["restaurant-data"].find({}, {"_id": 0}))
+        raw_rests = mongo.find("restaurant-data")
         print(f"   {len(raw_rests)} restaurants loaded")
 
-        restaurants = []
+        restaurants = RestaurantCatalog()
+        rest_sample = []
         for r in raw_rests:
             city = str(r.get("city", "Unknown"))
-            restaurants.append({
+            discount = r.get("discount_offer")
+            rest = {
                 "restaurant_id":      int(r.get("restaurant_id", 0)),
                 "restaurant_name":    str(r.get("restaurant_name", "Unknown")),
                 "cuisine_type":       str(r.get("cuisine_type", "Unknown")),
@@ -107,17 +123,19 @@ def load_from_mongodb():
                 "seating_capacity":   int(r.get("seating_capacity", 0)),
                 "is_pure_veg":        bool(r.get("is_pure_veg", False)),
                 "is_verified":        bool(r.get("is_verified", False)),
-                "discount_offer":     r.get("discount_offer"),
+                "discount_offer":     None if discount is None else str(discount),
                 "date_joined":        str(r.get("date_joined", "")),
                 "city_tier":          CITIES.get(city, DEFAULT_CITY)["tier"],
                 "tags":               str(r.get("tags", "")),
                 "payment_methods":    str(r.get("payment_methods", "")),
-            })
-
-        rest_map = {r["restaurant_id"]: r for r in restaurants}
+            }
+            restaurants.append(rest)
+            if len(rest_sample) < FOOTPRINT_SAMPLE:
+                rest_sample.append(rest)
+        restaurants.freeze()
 
         print("   Loading kpt-data...")
-        raw_orders = list(db["kpt-data"].find({}, {"_id": 0}))
+        raw_orders = mongo.find("kpt-data")
         print(f"   {len(raw_orders)} raw orders loaded")
 
         orders = []
@@ -148,16 +166,11 @@ def load_from_mongodb():
                 hour          = confirm_time.hour
                 peak_hour     = 1 if hour in [12, 13, 19, 20, 21] else 0
                 rid           = int(o.get("restaurant_id", 0))
-                rest          = rest_map.get(rid, {})
-                city          = rest.get("city", "Unknown")
 
                 orders.append({
                     "order_id":            str(o.get("order_id", "")),
                     "restaurant_id":       rid,
-                    "restaurant_name":     rest.get("restaurant_name", f"Restaurant #{rid}"),
-                    "city":                city,
-                    "city_tier":           CITIES.get(city, DEFAULT_CITY)["tier"],
-                    "cuisine_type":        rest.get("cuisine_type", "Unknown"),
+                    "restaurant_row":      restaurants.row_of(rid),
                     "order_time":          str(order_time),
                     "confirm_time":        str(confirm_time),
                     "merchant_ready_time": str(merchant_ready),
@@ -176,6 +189,7 @@ def load_from_mongodb():
                     "rider_idle_minutes":  round(rider_idle, 2),
                     "load_index":          round(load_index, 2),
                     "hour_of_day":         hour,
+                    "day_of_week":         confirm_time.weekday(),
                     "merchant_bias_type":  classify_bias(for_bias, prep_gap),
                 })
             except Exception:
@@ -183,15 +197,14 @@ def load_from_mongodb():
                 continue
 
         print(f"   {len(orders)} orders enriched  ({skipped} skipped)")
-        client.close()
-        return restaurants, orders
+        return restaurants, orders, rest_sample
 
     except Exception as e:
         print(f"   MongoDB error: {e}")
-        return None, None
+        return None, None, None
 
 def _fallback_data():
-    print("   Using fallback synthetic data (MongoDB unreachable)")
+    print("   Using synthetic data (ALLOW_SYNTHETIC_FALLBACK=true)")
     random.seed(42)
     city_list = list(CITIES.keys())
     rests = []
@@ -208,13 +221,12 @@ def _fallback_data():
             "discount_offer": "10% Off", "date_joined": "2020-01-01",
             "city_tier": CITIES[city]["tier"], "tags": "", "payment_methods": "UPI",
         })
-    rest_map = {r["restaurant_id"]: r for r in rests}
+    catalog = RestaurantCatalog.from_dicts(rests)
     orders = []
     base = datetime(2026, 2, 1)
     for i in range(1000):
         rid  = random.randint(1, 100)
-        rest = rest_map[rid]
-        city = rest["city"]
+        city = catalog.field(catalog.row_of(rid), "city")
         ci   = CITIES[city]
         ct   = base + timedelta(days=random.randint(0,28), hours=random.randint(6,23), minutes=random.randint(0,59))
         tkpt = random.uniform(8, 40) + ci["congestion_base"] * 3
@@ -228,8 +240,7 @@ def _fallback_data():
         sc   = random.randint(1, 6)
         orders.append({
             "order_id": f"ord_{i:05d}", "restaurant_id": rid,
-            "restaurant_name": rest["restaurant_name"],
-            "city": city, "city_tier": ci["tier"], "cuisine_type": "North Indian",
+            "restaurant_row": catalog.row_of(rid),
             "order_time": str(ct), "confirm_time": str(ct),
             "merchant_ready_time": str(mr), "actual_ready_time": str(ar),
             "rider_assigned_time": str(ra), "rider_arrival_time": str(ra),
@@ -242,22 +253,31 @@ def _fallback_data():
             "prep_gap_minutes":   round((ra-mr).total_seconds()/60,2),
             "rider_idle_minutes": round(max(0,(pu-ra).total_seconds()/60),2),
             "load_index":         round(ao/max(sc,1),2),
-            "hour_of_day": h,
+            "hour_of_day": h, "day_of_week": ct.weekday(),
             "merchant_bias_type": classify_bias(bias,(ra-mr).total_seconds()/60),
         })
-    return rests, orders
+    return catalog, orders, rests
 
 print("Initializing QuantumTrio KPT Signal Intelligence Engine...")
 print("-" * 60)
 
-RESTAURANTS, ORDERS = load_from_mongodb()
+RESTAURANTS, ORDERS, _REST_SAMPLE = load_from_mongodb() if MONGO_URL else (None, None, None)
+DATA_SOURCE                       = "MongoDB Live"
 if not RESTAURANTS or not ORDERS:
-    RESTAURANTS, ORDERS = _fallback_data()
+    if not ALLOW_SYNTHETIC_FALLBACK:
+        raise RuntimeError("MongoDB returned no data. Fix the connection or set ALLOW_SYNTHETIC_FALLBACK=true to run on synthetic data.")
+    RESTAURANTS, ORDERS, _REST_SAMPLE = _fallback_data()
+    DATA_SOURCE                       = "Synthetic Fallback"
 
-RESTAURANT_MAP    = {r["restaurant_id"]: r for r in RESTAURANTS}
-_CITIES_IN_DATA   = sorted({r.get("city","Unknown") for r in RESTAURANTS if r.get("city","Unknown") != "Unknown"})
+# RestaurantCatalog doubles as the id -> restaurant map
+RESTAURANT_MAP    = RESTAURANTS
+_CITIES_IN_DATA   = sorted(c for c in RESTAURANTS.categories("city") if c != "Unknown")
+MEMORY_FOOTPRINT  = footprint_report(RESTAURANTS, _REST_SAMPLE, ORDERS)
+del _REST_SAMPLE
 
 print(f"\nDataset: {len(RESTAURANTS)} restaurants | {len(ORDERS)} orders | {len(_CITIES_IN_DATA)} cities")
+print(f"Memory:  {MEMORY_FOOTPRINT['restaurant_bytes_compact']} B/restaurant (dict layout {MEMORY_FOOTPRINT['restaurant_bytes_dict']} B) | "
+      f"{MEMORY_FOOTPRINT['order_bytes_compact']} B/order (dict layout {MEMORY_FOOTPRINT['order_bytes_dict']} B)")
 print("-" * 60)
 
 def compute_restaurant_profiles():
@@ -345,7 +365,7 @@ def compute_system_kpis():
 def compute_city_analytics():
     city_data = defaultdict(lambda: {"orders":[],"idle_times":[],"biases":[],"true_kpts":[]})
     for o in ORDERS:
-        c = o["city"]
+        c = RESTAURANTS.field(o["restaurant_row"], "city", "Unknown")
         city_data[c]["orders"].append(o)
         city_data[c]["idle_times"].append(o["rider_idle_minutes"])
         city_data[c]["biases"].append(o["for_bias_minutes"])
@@ -399,7 +419,7 @@ def compute_signal_flow_simulation():
         ckt = o["true_kpt_minutes"] * random.uniform(0.95, 1.05)
         timeline.append({
             "order_id":      o["order_id"][:14],
-            "restaurant":    o["restaurant_name"],
+            "restaurant":    RESTAURANTS.field(o["restaurant_row"], "restaurant_name", f"Restaurant #{o['restaurant_id']}"),
             "true_kpt":      round(o["true_kpt_minutes"],  1),
             "marked_kpt":    round(o["marked_kpt_minutes"],1),
             "corrected_kpt": round(ckt, 1),
@@ -435,13 +455,53 @@ def compute_kitchen_rush_index():
     ri.sort(key=lambda x: x["rush_multiplier"], reverse=True)
     return ri[:15]
 
+def run_anomaly_stage():
+    city_of = RESTAURANTS.field
+    ANOMALY_DETECTOR.observe(ORDERS, lambda o: city_of(o["restaurant_row"], "city", "Unknown"))
+
+def compute_recent_orders(limit=20):
+    recent = defaultdict(list)
+    for o in ORDERS:
+        lst = recent[o["restaurant_id"]]
+        if len(lst) < limit:
+            lst.append(o)
+    return dict(recent)
+
+def compute_grouped_analytics():
+    """City / hourly / rush / profile rollups (optionally checked against MongoDB pipelines)"""
+    results = {
+        "restaurant_profiles": compute_restaurant_profiles(),
+        "city_analytics":      compute_city_analytics(),
+        "hourly_patterns":     compute_hourly_patterns(),
+        "rush_index":          compute_kitchen_rush_index(),
+    }
+    if ANALYTICS_PARITY_CHECK:
+        if DATA_SOURCE != "MongoDB Live":
+            print("   Pushdown parity check needs live MongoDB - skipped")
+        else:
+            print("   Running aggregation pipelines (pushdown parity check)...")
+            pushed = run_pushdown_analytics(get_mongo_manager(), RESTAURANT_MAP, CITIES, DEFAULT_CITY)
+            mismatches = check_parity(results, pushed)
+            print(f"   Pushdown parity: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+            for m in mismatches[:20]:
+                print(f"     {m}")
+    return results
+
 print("\nComputing signal intelligence profiles...")
-RESTAURANT_PROFILES = compute_restaurant_profiles()
+_GROUPED            = compute_grouped_analytics()
+RESTAURANT_PROFILES = _GROUPED["restaurant_profiles"]
 SYSTEM_KPIS         = compute_system_kpis()
-CITY_ANALYTICS      = compute_city_analytics()
-HOURLY_PATTERNS     = compute_hourly_patterns()
+CITY_ANALYTICS      = _GROUPED["city_analytics"]
+HOURLY_PATTERNS     = _GROUPED["hourly_patterns"]
 SIGNAL_FLOW         = compute_signal_flow_simulation()
-RUSH_INDEX          = compute_kitchen_rush_index()
+RUSH_INDEX          = _GROUPED["rush_index"]
+KPT_MATRIX          = KptMatrix.build(ORDERS, RESTAURANTS)
+RECENT_ORDERS       = compute_recent_orders()
+print(f"   KPT matrix: {KPT_MATRIX.n_slots} restaurants x 24h / 7x24h ({KPT_MATRIX.nbytes() // 1024} KB)")
+if ANOMALY_DETECTOR:
+    run_anomaly_stage()
+    _anomalies = ANOMALY_DETECTOR.summary()
+    print(f"   Anomaly stage: {_anomalies['active_alerts']} active alerts | {_anomalies['change_points']} recent change points | {_anomalies['rush_spikes']} rush spikes")
 print("All analytics ready - platform is live\n")
 
 @app.route("/")
@@ -451,10 +511,12 @@ def index():
 @app.route("/api/overview")
 def api_overview():
     return jsonify({
-        "status": "operational", "data_source": "MongoDB Live",
+        "status": "operational", "data_source": DATA_SOURCE,
         "team": "QuantumTrio", "leader": "Pranamika Kalita",
         "members": ["Porinistha Barooa", "Sumitabh Shyamal"],
         "system_kpis": SYSTEM_KPIS, "timestamp": datetime.now().isoformat(),
+        "mongo_query_stats": get_mongo_manager().query_stats(),
+        "memory_footprint": MEMORY_FOOTPRINT,
     })
 
 @app.route("/api/restaurants")
@@ -484,15 +546,14 @@ def api_restaurant_detail(restaurant_id):
     restaurant = RESTAURANT_MAP.get(restaurant_id)
     if not profile or not restaurant:
         return jsonify({"error": "Not found"}), 404
-    rest_orders = [o for o in ORDERS if o["restaurant_id"] == restaurant_id][:100]
-    hourly = defaultdict(list)
-    for o in rest_orders:
-        hourly[o["hour_of_day"]].append(o["true_kpt_minutes"])
-    hourly_kpt = [
-        {"hour": h, "avg_kpt": round(statistics.mean(vals),2), "count": len(vals)}
-        for h, vals in sorted(hourly.items())
-    ]
-    return jsonify({"profile": profile, "restaurant": restaurant, "hourly_kpt": hourly_kpt, "recent_orders": rest_orders[:20]})
+    weekday = request.args.get("weekday")
+    if weekday is not None:
+        if not weekday.isdigit() or int(weekday) > 6:
+            return jsonify({"error": "weekday must be 0 (Mon) - 6 (Sun)"}), 400
+        weekday = int(weekday)
+    hourly_kpt  = KPT_MATRIX.hourly(restaurant.row, weekday)
+    rest_orders = RECENT_ORDERS.get(restaurant_id, [])
+    return jsonify({"profile": profile, "restaurant": restaurant.to_dict(), "hourly_kpt": hourly_kpt, "weekday": weekday, "recent_orders": [RESTAURANTS.order_view(o) for o in rest_orders]})
 
 @app.route("/api/city-analytics")
 def api_city_analytics():
@@ -508,7 +569,43 @@ def api_signal_flow():
 
 @app.route("/api/rush-index")
 def api_rush_index():
-    return jsonify({"rush_data": RUSH_INDEX})
+    city = request.args.get("city", "")
+    if not city:
+        return jsonify({"rush_data": RUSH_INDEX})
+    # Per-city ranking straight from the precomputed KPT matrix
+    limit = request.args.get("limit", "50")
+    if not limit.isdigit():
+        return jsonify({"error": "limit must be a non-negative integer"}), 400
+    limit = int(limit)
+    return jsonify({
+        "city": city,
+        "rush_data": KPT_MATRIX.rush_ranking(city, limit),
+        "cities": KPT_MATRIX.ranked_cities(),
+    })
+
+@app.route("/api/anomalies")
+def api_anomalies():
+    if not ANOMALY_DETECTOR:
+        return jsonify({"enabled": False, "active_alerts": [], "change_points": []})
+    scope = request.args.get("scope") or None
+    key   = request.args.get("key") or None
+    limit = request.args.get("limit", "50")
+    if not limit.isdigit():
+        return jsonify({"error": "limit must be a non-negative integer"}), 400
+    limit = int(limit)
+    if scope == "restaurant" and key is not None:
+        if not key.isdigit():
+            return jsonify({"error": "key must be a numeric restaurant_id for scope=restaurant"}), 400
+        key = int(key)
+    alerts = ANOMALY_DETECTOR.active_alerts(scope, key)
+    return jsonify({
+        "enabled":       True,
+        "summary":       ANOMALY_DETECTOR.summary(),
+        "active_alerts": alerts[:limit],
+        "change_points": ANOMALY_DETECTOR.recent_events(scope, key, "change_point", limit),
+        "rush_spikes":   ANOMALY_DETECTOR.recent_events(scope, key, "rush_spike", limit),
+        "baseline":      ANOMALY_DETECTOR.baseline(scope, key) if scope and key is not None else None,
+    })
 
 @app.route("/api/predict-kpt", methods=["POST"])
 def api_predict_kpt():
@@ -0,0 +1,247 @@
+"""
+Compact Restaurant Catalog — QuantumTrio
+Column-oriented, array-backed storage for restaurant metadata.
+
+Numeric fields live in `array` columns, repeated strings (city, state,
+cuisine, price_range, availability, payment_methods, ...) are
+dictionary-encoded into interned value tables (the value -> code hash
+tables are dropped by `freeze()` once loading is done), and rows are exposed
+through a small __slots__ record view that behaves like the old dict
+(`rec["city"]`, `rec.get("city")`, `rec.to_dict()`).
+
+Orders reference a restaurant by its integer catalog row
+(`order["restaurant_row"]`, -1 when unknown) instead of copying
+restaurant_name / city / cuisine_type into every order.
+"""
+
+import sys
+from array import array
+
+# field -> array typecode
+NUMERIC_FIELDS = {
+    "restaurant_id":      "q",
+    "rating":             "d",
+    "total_reviews":      "q",
+    "total_orders":       "q",
+    "avg_meal_price_inr": "d",
+    "latitude":           "d",
+    "longitude":          "d",
+    "seating_capacity":   "q",
+    "city_tier":          "b",
+}
+BOOL_FIELDS = ("is_pure_veg", "is_verified")
+CATEGORICAL_FIELDS = (
+    "restaurant_name", "cuisine_type", "price_range", "city", "state",
+    "operating_hours", "availability", "discount_offer", "date_joined",
+    "tags", "payment_methods",
+)
+FIELDS = (
+    "restaurant_id", "restaurant_name", "cuisine_type", "rating", "total_reviews",
+    "total_orders", "price_range", "avg_meal_price_inr", "city", "state",
+    "latitude", "longitude", "operating_hours", "availability", "seating_capacity",
+    "is_pure_veg", "is_verified", "discount_offer", "date_joined", "city_tier",
+    "tags", "payment_methods",
+)
+
+# Restaurant fields that orders used to duplicate
+ORDER_RESTAURANT_FIELDS = ("restaurant_name", "city", "cuisine_type", "city_tier")
+
+
+class _Dictionary:
+    """Dictionary encoding for one categorical column: value <-> small int code"""
+
+    __slots__ = ("codes", "values")
+
+    def __init__(self):
+        self.codes  = {}
+        self.values = []
+
+    def encode(self, value):
+        if self.codes is None:
+            raise RuntimeError("catalog is frozen")
+        code = self.codes.get(value)
+        if code is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class RestaurantRecord:
+    """Read-only view of one catalog row (dict-like)"""
+
+    __slots__ = ("_catalog", "row")
+
+    def __init__(self, catalog, row):
+        self._catalog = catalog
+        self.row      = row
+
+    def __getitem__(self, field):
+        return self._catalog.field(self.row, field)
+
+    def get(self, field, default=None):
+        if field not in self._catalog._columns:
+            return default
+        return self._catalog.field(self.row, field)
+
+    def keys(self):
+        return FIELDS
+
+    def to_dict(self):
+        return {f: self._catalog.field(self.row, f) for f in FIELDS}
+
+
+class RestaurantCatalog:
+    """
+    Array-backed restaurant table with id -> row lookup.
+
+    Supports the subset of the old RESTAURANTS list / RESTAURANT_MAP dict
+    API the app uses: len(), iteration, `in`, and `.get(restaurant_id)`.
+    """
+
+    def __init__(self):
+        self._columns = {}
+        self._dicts   = {}
+        for f, code in NUMERIC_FIELDS.items():
+            self._columns[f] = array(code)
+        for f in BOOL_FIELDS:
+            self._columns[f] = array("b")
+        for f in CATEGORICAL_FIELDS:
+            self._columns[f] = array("I")
+            self._dicts[f]   = _Dictionary()
+        self._row_by_id = {}
+
+    @classmethod
+    def from_dicts(cls, restaurants):
+        catalog = cls()
+        for r in restaurants:
+            catalog.append(r)
+        catalog.freeze()
+        return catalog
+
+    def append(self, r):
+        """Append one restaurant dict (normalized, all FIELDS present); returns its row"""
+        row = len(self)
+        rid = r["restaurant_id"]
+        for f in NUMERIC_FIELDS:
+            self._columns[f].append(r[f])
+        for f in BOOL_FIELDS:
+            self._columns[f].append(1 if r[f] else 0)
+        for f in CATEGORICAL_FIELDS:
+            self._columns[f].append(self._dicts[f].encode(r[f]))
+        self._row_by_id[rid] = row
+        return row
+
+    def freeze(self):
+        """
+        Finish loading: drop the value -> code hash tables. Reads only need
+        the code -> value lists, and for near-unique columns (names, tags,
+        dates, hours) the hash tables would cost more than the strings.
+        """
+        for d in self._dicts.values():
+            d.codes = None
+        return self
+
+    # ── Lookup ────────────────────────────────────────────────
+    def __len__(self):
+        return len(self._columns["restaurant_id"])
+
+    def __iter__(self):
+        return (RestaurantRecord(self, row) for row in range(len(self)))
+
+    def __contains__(self, restaurant_id):
+        return restaurant_id in self._row_by_id
+
+    def row_of(self, restaurant_id):
+        return self._row_by_id.get(restaurant_id, -1)
+
+    def get(self, restaurant_id, default=None):
+        row = self._row_by_id.get(restaurant_id)
+        return default if row is None else RestaurantRecord(self, row)
+
+    def field(self, row, field, default=None):
+        """Value of `field` at `row` (`default` for row -1)"""
+        if row < 0:
+            return default
+        value = self._columns[field][row]
+        if field in self._dicts:
+            return self._dicts[field].values[value]
+        if field in BOOL_FIELDS:
+            return bool(value)
+        return value
+
+    def categories(self, field):
+        """Distinct values of a categorical column"""
+        return list(self._dicts[field].values)
+
+    # ── Orders ────────────────────────────────────────────────
+    def order_view(self, order):
+        """Order dict with the restaurant fields it references filled back in (for JSON)"""
+        row = order["restaurant_row"]
+        out = dict(order)
+        out["restaurant_name"] = self.field(row, "restaurant_name", f"Restaurant #{order['restaurant_id']}")
+        out["city"]            = self.field(row, "city", "Unknown")
+        out["cuisine_type"]    = self.field(row, "cuisine_type", "Unknown")
+        out["city_tier"]       = self.field(row, "city_tier", 2)
+        return out
+
+    # ── Memory accounting ─────────────────────────────────────
+    def nbytes(self):
+        objs = list(self._columns.values()) + [self._row_by_id]
+        for d in self._dicts.values():
+            objs += [d.values] if d.codes is None else [d.codes, d.values]
+        return _deep_size(objs)
+
+
+def _deep_size(objs):
+    """sys.getsizeof over a graph of dicts/lists/tuples, counting each object once"""
+    seen, total, stack = set(), 0, list(objs)
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple)):
+            stack.extend(o)
+    return total
+
+
+def footprint_report(catalog, restaurant_sample, orders, sample_size=2000):
+    """
+    Per-restaurant and per-order memory, compact layout vs the old dict layout.
+    `restaurant_sample` holds original restaurant dicts (as loaded) for the
+    baseline; orders are sampled and re-expanded to the old layout.
+    """
+    rest_sample  = restaurant_sample[:sample_size]
+    order_sample = orders[:sample_size]
+    legacy_orders = []
+    for o in order_sample:
+        lo = {k: v for k, v in o.items() if k != "restaurant_row"}
+        for f in ORDER_RESTAURANT_FIELDS:
+            lo[f] = catalog.field(o["restaurant_row"], f, "Unknown")
+        legacy_orders.append(lo)
+
+    legacy_rest = compact_rest = legacy_ord = compact_ord = 0.0
+    if rest_sample and len(catalog):
+        # The old RESTAURANT_MAP also held a dict entry per restaurant
+        legacy_rest  = _deep_size(rest_sample) / len(rest_sample) + sys.getsizeof({i: None for i in range(len(catalog))}) / len(catalog)
+        compact_rest = catalog.nbytes() / len(catalog)
+    if order_sample:
+        legacy_ord   = _deep_size(legacy_orders) / len(order_sample)
+        compact_ord  = _deep_size(order_sample) / len(order_sample)
+    return {
+        "restaurants":                len(catalog),
+        "orders":                     len(orders),
+        "restaurant_bytes_dict":      round(legacy_rest, 1),
+        "restaurant_bytes_compact":   round(compact_rest, 1),
+        "order_bytes_dict":           round(legacy_ord, 1),
+        "order_bytes_compact":        round(compact_ord, 1),
+        "restaurant_savings_pct":     round((1 - compact_rest / legacy_rest) * 100, 1) if legacy_rest else 0.0,
+        "order_savings_pct":          round((1 - compact_ord / legacy_ord) * 100, 1) if legacy_ord else 0.0,
+    }
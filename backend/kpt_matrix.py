@@ -0,0 +1,163 @@
+"""
+Precomputed KPT Profiles — QuantumTrio
+Dense restaurant×hour and restaurant×weekday×hour matrices of true KPT
+(count, mean, variance, p90 per cell) built once from every order.
+
+Only restaurants that have orders get a matrix slot (catalog row -> slot
+via `slot_of`), and cell statistics are stored as float32 arrays, so the
+matrices stay compact even for a large catalog. Reads are O(24) per
+restaurant. Peak / off-peak KPT means are accumulated in the same pass,
+split by each order's `peak_hour` flag exactly like
+compute_kitchen_rush_index, so the rush index can be ranked per city
+without rescanning orders.
+"""
+
+import statistics
+from array import array
+from collections import defaultdict
+
+HOURS    = 24
+WEEKDAYS = 7
+
+
+class _CellStats:
+    """count / mean / variance / p90 for a flat block of cells"""
+
+    __slots__ = ("count", "mean", "var", "p90")
+
+    def __init__(self, n_cells):
+        self.count = array("I", [0]) * n_cells
+        self.mean  = array("f", [0.0]) * n_cells
+        self.var   = array("f", [0.0]) * n_cells
+        self.p90   = array("f", [0.0]) * n_cells
+
+    def fill(self, cell_values):
+        for cell, vals in cell_values.items():
+            n = len(vals)
+            vals.sort()
+            mean = sum(vals) / n
+            self.count[cell] = n
+            self.mean[cell]  = mean
+            # sample variance, matching statistics.variance
+            self.var[cell]   = sum((v - mean) ** 2 for v in vals) / (n - 1) if n > 1 else 0.0
+            # same percentile convention as compute_system_kpis
+            self.p90[cell]   = vals[int(n * 0.90)]
+
+    def cell(self, i):
+        return {
+            "count":    self.count[i],
+            "avg_kpt":  round(self.mean[i], 2),
+            "variance": round(self.var[i],  2),
+            "p90_kpt":  round(self.p90[i],  2),
+        }
+
+
+class KptMatrix:
+    """Per-restaurant hourly / weekday-hourly KPT profiles and rush curves"""
+
+    def __init__(self, catalog, n_slots, slot_of):
+        self.catalog      = catalog
+        self.n_slots      = n_slots
+        self.slot_of      = slot_of
+        self.row_of_slot  = array("i", [-1]) * n_slots
+        for row, slot in enumerate(slot_of):
+            if slot >= 0:
+                self.row_of_slot[slot] = row
+        self.hour         = _CellStats(n_slots * HOURS)
+        self.weekday_hour = _CellStats(n_slots * WEEKDAYS * HOURS)
+        # float64 so rush multipliers round exactly like compute_kitchen_rush_index
+        self.peak_kpt     = array("d", [0.0]) * n_slots
+        self.off_peak_kpt = array("d", [0.0]) * n_slots
+        self._city_rank   = {}
+
+    @classmethod
+    def build(cls, orders, catalog):
+        slot_of = array("i", [-1]) * len(catalog)
+        n_slots = 0
+        hour_vals    = defaultdict(list)
+        weekday_vals = defaultdict(list)
+        # per slot: (peak KPTs, off-peak KPTs); build-time only, like the cell lists
+        rush = []
+        for o in orders:
+            row = o["restaurant_row"]
+            if row < 0:
+                continue
+            slot = slot_of[row]
+            if slot < 0:
+                slot = slot_of[row] = n_slots
+                n_slots += 1
+                rush.append(([], []))
+            kpt = o["true_kpt_minutes"]
+            h   = o["hour_of_day"]
+            hour_vals[slot * HOURS + h].append(kpt)
+            weekday_vals[(slot * WEEKDAYS + o["day_of_week"]) * HOURS + h].append(kpt)
+            rush[slot][0 if o["peak_hour"] else 1].append(kpt)
+
+        m = cls(catalog, n_slots, slot_of)
+        m.hour.fill(hour_vals)
+        m.weekday_hour.fill(weekday_vals)
+        m._build_rush_curves(rush)
+        return m
+
+    def _build_rush_curves(self, rush):
+        by_city = defaultdict(list)
+        for slot, (peak, off) in enumerate(rush):
+            if peak and off:
+                # statistics.mean, as compute_kitchen_rush_index, so both modes round identically
+                self.peak_kpt[slot]     = statistics.mean(peak)
+                self.off_peak_kpt[slot] = statistics.mean(off)
+                city = self.catalog.field(self.row_of_slot[slot], "city", "Unknown")
+                by_city[city].append(slot)
+        for city, slots in by_city.items():
+            slots.sort(key=self._rush_multiplier, reverse=True)
+            self._city_rank[city] = array("i", slots)
+
+    def _rush_multiplier(self, slot):
+        return self.peak_kpt[slot] / max(self.off_peak_kpt[slot], 1)
+
+    # ── Reads ─────────────────────────────────────────────────
+    def hourly(self, row, weekday=None):
+        """Non-empty hour cells for a catalog row (optionally for one weekday, 0=Mon)"""
+        slot = self.slot_of[row] if row >= 0 else -1
+        if slot < 0:
+            return []
+        if weekday is None:
+            stats, base = self.hour, slot * HOURS
+        else:
+            stats, base = self.weekday_hour, (slot * WEEKDAYS + weekday) * HOURS
+        return [
+            {"hour": h, **stats.cell(base + h)}
+            for h in range(HOURS) if stats.count[base + h]
+        ]
+
+    def rush_ranking(self, city, limit=None):
+        """City's restaurants ranked by peak / off-peak KPT multiplier"""
+        slots = self._city_rank.get(city, ())
+        if limit is not None:
+            slots = slots[:limit]
+        result = []
+        for slot in slots:
+            row = self.row_of_slot[slot]
+            rr  = self._rush_multiplier(slot)
+            base = slot * HOURS
+            result.append({
+                "restaurant_id":   self.catalog.field(row, "restaurant_id"),
+                "restaurant_name": self.catalog.field(row, "restaurant_name", "Unknown"),
+                "city":            city,
+                "order_count":     sum(self.hour.count[base:base + HOURS]),
+                "peak_kpt":        round(self.peak_kpt[slot], 1),
+                "off_peak_kpt":    round(self.off_peak_kpt[slot], 1),
+                "rush_multiplier": round(rr, 2),
+                "load_spike":      round((rr-1)*100, 1),
+            })
+        return result
+
+    def ranked_cities(self):
+        return sorted(self._city_rank)
+
+    def nbytes(self):
+        arrays = [self.slot_of, self.row_of_slot, self.peak_kpt, self.off_peak_kpt]
+        for s in (self.hour, self.weekday_hour):
+            arrays += [s.count, s.mean, s.var, s.p90]
+        arrays += list(self._city_rank.values())
+        return sum(a.itemsize * len(a) for a in arrays)
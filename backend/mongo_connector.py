@@ -2,14 +2,18 @@
 MongoDB Integration Module — QuantumTrio
 Connects to real Zomathon MongoDB database
 
-Usage: Set USE_MONGODB=true environment variable to switch from
-       simulated data to live MongoDB data.
+Usage: Set MONGO_URL. All queries go through one pooled, long-lived
+       MongoConnectionManager (see get_mongo_manager). Synthetic data is
+       only used when ALLOW_SYNTHETIC_FALLBACK=true is set explicitly.
 
 Database: zomathon
 Collections: kpt-data, restaurant-data
 """
 
 import os
+import time
+import threading
+from collections import defaultdict
 from datetime import datetime
 from dateutil import parser as dateparser
 
@@ -21,18 +25,174 @@ except ImportError:
     pass  # python-dotenv not installed — falls back to system env vars
 
 MONGO_URL = os.environ.get("MONGO_URL", "")
+MONGO_DB  = os.environ.get("MONGO_DB", "zomathon")
+
+# Pool / timeout / retry settings (all overridable via env)
+MONGO_MAX_POOL_SIZE       = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE       = int(os.environ.get("MONGO_MIN_POOL_SIZE", 2))
+MONGO_MAX_IDLE_MS         = int(os.environ.get("MONGO_MAX_IDLE_MS", 300000))
+MONGO_CONNECT_TIMEOUT_MS  = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS   = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 60000))
+MONGO_SELECT_TIMEOUT_MS   = int(os.environ.get("MONGO_SELECT_TIMEOUT_MS", 8000))
+MONGO_QUERY_TIMEOUT_MS    = int(os.environ.get("MONGO_QUERY_TIMEOUT_MS", 120000))
+MONGO_READ_PREFERENCE     = os.environ.get("MONGO_READ_PREFERENCE", "primaryPreferred")
+MONGO_RETRY_ATTEMPTS      = int(os.environ.get("MONGO_RETRY_ATTEMPTS", 4))
+MONGO_RETRY_BASE_DELAY_S  = float(os.environ.get("MONGO_RETRY_BASE_DELAY_S", 0.5))
+MONGO_RETRY_MAX_DELAY_S   = float(os.environ.get("MONGO_RETRY_MAX_DELAY_S", 8.0))
+
+# Synthetic data is only used when explicitly requested
+ALLOW_SYNTHETIC_FALLBACK = os.environ.get("ALLOW_SYNTHETIC_FALLBACK", "false").lower() in ("1", "true", "yes")
+
+
+class MongoConnectionManager:
+    """
+    Long-lived, pooled MongoDB client shared by the whole process.
+
+    The client is created lazily on first use and kept open, so later
+    refreshes and on-demand queries reuse pooled connections instead of
+    paying connection setup and TLS again. Transient network errors are
+    retried with exponential backoff, and every query records its latency
+    and document count in `query_stats`.
+    """
+
+    def __init__(self, url=None, db_name=None):
+        self.url        = url if url is not None else MONGO_URL
+        self.db_name    = db_name or MONGO_DB
+        self._client    = None
+        self._lock      = threading.Lock()   # guards _stats only; never held across I/O or sleeps
+        self._conn_lock = threading.Lock()   # serializes first connect / close
+        self._stats     = defaultdict(lambda: {
+            "calls": 0, "errors": 0, "retries": 0, "documents": 0,
+            "total_ms": 0.0, "last_ms": 0.0, "max_ms": 0.0,
+        })
+
+    # ── Connection ────────────────────────────────────────────
+    def client(self):
+        """Return the shared client, connecting (with retries) on first use"""
+        if self._client is not None:
+            return self._client
+        with self._conn_lock:
+            if self._client is None:
+                if not self.url:
+                    raise RuntimeError("MONGO_URL is not set. Add it to your .env file.")
+                from pymongo import MongoClient
+                client = MongoClient(
+                    self.url,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGO_SELECT_TIMEOUT_MS,
+                    readPreference=MONGO_READ_PREFERENCE,
+                    retryReads=True,
+                    appname="quantumtrio-kpt",
+                )
+                try:
+                    self._with_retry("admin.ping", lambda: client.admin.command("ping"))
+                except Exception:
+                    client.close()
+                    raise
+                print("✅ MongoDB connected successfully")
+                self._client = client
+        return self._client
+
+    def db(self):
+        return self.client()[self.db_name]
+
+    def close(self):
+        with self._conn_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    # ── Retry / instrumentation ───────────────────────────────
+    def _with_retry(self, name, fn):
+        from pymongo.errors import AutoReconnect, ConnectionFailure
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except (AutoReconnect, ConnectionFailure) as e:
+                attempt += 1
+                if attempt >= MONGO_RETRY_ATTEMPTS:
+                    raise
+                delay = min(MONGO_RETRY_BASE_DELAY_S * (2 ** (attempt - 1)), MONGO_RETRY_MAX_DELAY_S)
+                with self._lock:
+                    self._stats[name]["retries"] += 1
+                print(f"   [mongo] {name} failed ({e.__class__.__name__}), retry {attempt}/{MONGO_RETRY_ATTEMPTS - 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _timed(self, name, fn):
+        start = time.perf_counter()
+        try:
+            docs = self._with_retry(name, fn)
+        except Exception:
+            with self._lock:
+                self._stats[name]["errors"] += 1
+            raise
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            s = self._stats[name]
+            s["calls"]     += 1
+            s["documents"] += len(docs)
+            s["total_ms"]  += elapsed
+            s["last_ms"]    = elapsed
+            s["max_ms"]     = max(s["max_ms"], elapsed)
+        print(f"   [mongo] {name}: {len(docs)} docs in {elapsed:.1f} ms")
+        return docs
+
+    def find(self, collection, query=None, projection=None, limit=0):
+        """Run a find() against the shared pool and return the documents as a list"""
+        projection = projection if projection is not None else {"_id": 0}
+        def run():
+            cursor = self.db()[collection].find(query or {}, projection)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor.max_time_ms(MONGO_QUERY_TIMEOUT_MS))
+        return self._timed(f"{collection}.find", run)
+
+    def aggregate(self, collection, pipeline, name=None):
+        """Run an aggregation pipeline (allowDiskUse) and return the result documents"""
+        def run():
+            return list(self.db()[collection].aggregate(
+                pipeline, allowDiskUse=True, maxTimeMS=MONGO_QUERY_TIMEOUT_MS,
+            ))
+        return self._timed(name or f"{collection}.aggregate", run)
+
+    def query_stats(self):
+        """Per-query latency / document-count snapshot"""
+        with self._lock:
+            return {
+                name: {
+                    **s,
+                    "total_ms": round(s["total_ms"], 1),
+                    "last_ms":  round(s["last_ms"], 1),
+                    "max_ms":   round(s["max_ms"], 1),
+                    "avg_ms":   round(s["total_ms"] / s["calls"], 1) if s["calls"] else 0.0,
+                }
+                for name, s in self._stats.items()
+            }
+
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_mongo_manager():
+    """Process-wide connection manager (created once, reused everywhere)"""
+    global _MANAGER
+    if _MANAGER is None:
+        with _MANAGER_LOCK:
+            if _MANAGER is None:
+                _MANAGER = MongoConnectionManager()
+    return _MANAGER
 
 
 def get_mongo_client():
-    """Get pymongo client"""
+    """Get the shared pymongo client"""
     try:
-        from pymongo import MongoClient
-        if not MONGO_URL:
-            raise ValueError("MONGO_URL is not set. Add it to your .env file.")
-        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=5000)
-        client.admin.command('ping')
-        print("✅ MongoDB connected successfully")
-        return client
+        return get_mongo_manager().client()
     except Exception as e:
         print(f"⚠️  MongoDB connection failed: {e}")
         return None
@@ -48,18 +208,18 @@ def parse_dt(val):
         return None
 
 
-def load_restaurants_from_mongo(client):
+def load_restaurants_from_mongo(manager=None):
     """Load restaurant data from MongoDB"""
-    db = client["zomathon"]
-    restaurants = list(db["restaurant-data"].find({}, {"_id": 0}))
+    manager = manager or get_mongo_manager()
+    restaurants = manager.find("restaurant-data")
     print(f"📦 Loaded {len(restaurants)} restaurants from MongoDB")
     return restaurants
 
 
-def load_kpt_orders_from_mongo(client, limit=10000):
+def load_kpt_orders_from_mongo(manager=None, limit=10000):
     """Load KPT order data from MongoDB and compute derived signals"""
-    db = client["zomathon"]
-    raw_orders = list(db["kpt-data"].find({}, {"_id": 0}).limit(limit))
+    manager = manager or get_mongo_manager()
+    raw_orders = manager.find("kpt-data", limit=limit)
     print(f"📦 Loaded {len(raw_orders)} raw orders from MongoDB")
 
     enriched = []
@@ -145,9 +305,10 @@ def enrich_orders_with_restaurants(orders, restaurants):
 if __name__ == "__main__":
     client = get_mongo_client()
     if client:
-        rests = load_restaurants_from_mongo(client)
-        orders = load_kpt_orders_from_mongo(client)
+        rests = load_restaurants_from_mongo()
+        orders = load_kpt_orders_from_mongo()
         orders = enrich_orders_with_restaurants(orders, rests)
         print(f"\n📊 Sample enriched order:")
         import json
         print(json.dumps(orders[0] if orders else {}, indent=2, default=str))
+        print(json.dumps(get_mongo_manager().query_stats(), indent=2))
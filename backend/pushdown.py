@@ -0,0 +1,317 @@
+"""
+Pushdown Analytics Parity Check — QuantumTrio
+Computes the city, hourly, rush-index and restaurant-profile rollups inside
+MongoDB with $group / $bucket aggregation pipelines and compares them with
+the in-process compute_* functions.
+
+This is a diagnostic, not a serving backend: the per-order endpoints need
+every raw kpt-data order in memory anyway, so serving from the pipelines
+would only add two collection scans. Set ANALYTICS_PARITY_CHECK=true to run
+it at startup against live MongoDB.
+
+Output structures are identical to the compute_* functions in app.py.
+"""
+
+import math
+
+PEAK_HOURS = [12, 13, 19, 20, 21]
+
+# Mirrors app.parse_dt: a prefix regex for "dd-mm-yyyy HH.MM" (trailing text
+# such as seconds is ignored), then exact formats tried in order
+_DOTTED_RE    = r"^(\d{2})-(\d{2})-(\d{4})\s+(\d{2})\.(\d{2})"
+_DATE_FORMATS  = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M"]
+
+
+# ── Pipeline building blocks ──────────────────────────────────
+def _parse_date(field):
+    """
+    Server-side equivalent of parse_dt: native dates pass through; strings
+    matching the dotted prefix are rebuilt from its captures and parsed
+    (an invalid date is dropped, as datetime() raises in the loader), and
+    anything else tries each exact format.
+    """
+    ref = "$" + field
+    parsed = None
+    for fmt in reversed(_DATE_FORMATS):
+        parsed = {"$dateFromString": {
+            "dateString": "$$s",
+            "format":     fmt,
+            "onError":    parsed,
+            "onNull":     None,
+        }}
+    cap = [{"$arrayElemAt": ["$$m.captures", i]} for i in range(5)]
+    dotted = {"$dateFromString": {
+        "dateString": {"$concat": [cap[0], "-", cap[1], "-", cap[2], " ", cap[3], ".", cap[4]]},
+        "format":     "%d-%m-%Y %H.%M",
+        "onError":    None,
+    }}
+    from_string = {"$let": {
+        "vars": {"s": {"$trim": {"input": {"$toString": ref}}}},
+        "in": {"$let": {
+            "vars": {"m": {"$regexFind": {"input": "$$s", "regex": _DOTTED_RE}}},
+            "in":   {"$cond": [{"$eq": ["$$m", None]}, parsed, dotted]},
+        }},
+    }}
+    return {"$cond": [{"$eq": [{"$type": ref}, "date"]}, ref, from_string]}
+
+
+def _convert(field, to, default):
+    """
+    Server-side equivalent of the loader's int()/float(o.get(field, default)):
+    a missing field takes `default`; a null or unconvertible value becomes
+    null so the order is dropped, exactly as the Python loader skips it.
+    """
+    ref = "$" + field
+    return {"$cond": [
+        {"$eq": [{"$type": ref}, "missing"]},
+        default,
+        {"$convert": {"input": ref, "to": to, "onError": None, "onNull": None}},
+    ]}
+
+
+def _minutes(end, start):
+    return {"$round": [{"$divide": [{"$subtract": ["$" + end, "$" + start]}, 60000]}, 2]}
+
+
+def _enriched_stages():
+    """
+    Stages shared by every rollup: parse timestamps, convert numeric fields
+    and derive the per-order signals. Orders the Python loader would skip
+    (unparseable timestamps, non-numeric restaurant_id / active_orders /
+    staff_count / distance_km / peak_hour) are dropped here as well.
+    """
+    required = ("restaurant_id", "active_orders", "staff_count", "distance_km",
+                "confirm", "merchant_ready", "actual_ready", "rider_arrival", "pickup")
+    return [
+        {"$project": {
+            "_id": 0,
+            "restaurant_id":  _convert("restaurant_id", "long", 0),
+            "active_orders":  _convert("active_orders", "long", 5),
+            "staff_count":    _convert("staff_count",   "long", 3),
+            "distance_km":    _convert("distance_km",   "double", 0.0),
+            # peak_hour defaults to the hour-derived flag, which needs $hour first
+            "peak_missing":   {"$eq": [{"$type": "$peak_hour"}, "missing"]},
+            "raw_peak":       {"$convert": {"input": "$peak_hour", "to": "int", "onError": None, "onNull": None}},
+            "confirm":        _parse_date("confirm_time"),
+            "merchant_ready": _parse_date("merchant_ready_time"),
+            "actual_ready":   _parse_date("actual_ready_time"),
+            "rider_arrival":  _parse_date("rider_arrival_time"),
+            "pickup":         _parse_date("pickup_time"),
+        }},
+        {"$match": {
+            **{f: {"$ne": None} for f in required},
+            "$or": [{"peak_missing": True}, {"raw_peak": {"$ne": None}}],
+        }},
+        {"$project": {
+            "restaurant_id": 1,
+            "peak_missing":  1,
+            "raw_peak":      1,
+            "hour":          {"$hour": "$confirm"},
+            "true_kpt":      _minutes("actual_ready", "confirm"),
+            "marked_kpt":    _minutes("merchant_ready", "confirm"),
+            "for_bias":      _minutes("merchant_ready", "actual_ready"),
+            "rider_idle":    {"$round": [{"$max": [0, {"$divide": [{"$subtract": ["$pickup", "$rider_arrival"]}, 60000]}]}, 2]},
+        }},
+        {"$addFields": {
+            "peak": {"$cond": ["$peak_missing", {"$cond": [{"$in": ["$hour", PEAK_HOURS]}, 1, 0]}, "$raw_peak"]},
+        }},
+    ]
+
+
+def _restaurant_pipeline():
+    # truthiness, as `if o["peak_hour"]` in compute_kitchen_rush_index
+    is_peak = {"$ne": ["$peak", 0]}
+    return _enriched_stages() + [
+        {"$group": {
+            "_id":           "$restaurant_id",
+            "n":             {"$sum": 1},
+            "sum_bias":      {"$sum": "$for_bias"},
+            "sumsq_bias":    {"$sum": {"$multiply": ["$for_bias", "$for_bias"]}},
+            "sum_idle":      {"$sum": "$rider_idle"},
+            "sum_true":      {"$sum": "$true_kpt"},
+            "sum_marked":    {"$sum": "$marked_kpt"},
+            "peak_n":        {"$sum": {"$cond": [is_peak, 1, 0]}},
+            "peak_sum_true": {"$sum": {"$cond": [is_peak, "$true_kpt", 0]}},
+        }},
+    ]
+
+
+def _hourly_pipeline():
+    return _enriched_stages() + [
+        {"$bucket": {
+            "groupBy":    "$hour",
+            "boundaries": list(range(25)),
+            "default":    "other",
+            "output": {
+                "n":        {"$sum": 1},
+                "sum_kpt":  {"$sum": "$true_kpt"},
+                "sum_bias": {"$sum": "$for_bias"},
+                "sum_idle": {"$sum": "$rider_idle"},
+            },
+        }},
+    ]
+
+
+# ── Shaping (same structures as the in-process compute_* functions) ──
+def _profiles(rows, restaurant_map):
+    result = {}
+    for r in rows:
+        rid, n = r["_id"], r["n"]
+        if not n:
+            continue
+        avg_bias   = r["sum_bias"]   / n
+        avg_idle   = r["sum_idle"]   / n
+        avg_true   = r["sum_true"]   / n
+        avg_marked = r["sum_marked"] / n
+        std_bias   = math.sqrt(max(r["sumsq_bias"] - n * avg_bias * avg_bias, 0) / (n - 1)) if n > 1 else 0
+        bias_norm  = min(abs(avg_bias) / 10.0, 1.0)
+        idle_norm  = min(avg_idle / 5.0, 1.0)
+        rel_score  = round(bias_norm * 0.6 + idle_norm * 0.4, 3)
+        if abs(avg_bias) < 1.5:
+            detected_bias = "reliable"
+        elif avg_bias > 0 and std_bias < 3:
+            detected_bias = "systematic_delay"
+        elif avg_bias > 3:
+            detected_bias = "rider_triggered"
+        else:
+            detected_bias = "peak_manipulator"
+        kpt_error_pct = abs(avg_marked - avg_true) / max(avg_true, 1) * 100
+        result[rid] = {
+            "restaurant_id":      rid,
+            "restaurant_name":    restaurant_map.get(rid, {}).get("restaurant_name", "Unknown"),
+            "city":               restaurant_map.get(rid, {}).get("city", "Unknown"),
+            "order_count":        n,
+            "avg_true_kpt":       round(avg_true,   2),
+            "avg_marked_kpt":     round(avg_marked, 2),
+            "avg_for_bias":       round(avg_bias,   2),
+            "avg_idle_time":      round(avg_idle,   2),
+            "reliability_score":  rel_score,
+            "detected_bias_type": detected_bias,
+            "kpt_error_pct":      round(kpt_error_pct, 1),
+            "signal_quality":     "HIGH" if rel_score < 0.3 else ("MEDIUM" if rel_score < 0.6 else "LOW"),
+        }
+    return result
+
+
+def _city_analytics(rows, restaurant_map, cities, default_city):
+    # Restaurant-level sums are rolled up to cities here: the restaurant
+    # catalog is already in memory, so no $lookup is needed server-side.
+    city_data = {}
+    for r in rows:
+        city = restaurant_map.get(r["_id"], {}).get("city", "Unknown")
+        c = city_data.setdefault(city, {"n": 0, "sum_idle": 0.0, "sum_bias": 0.0, "sum_true": 0.0})
+        c["n"]        += r["n"]
+        c["sum_idle"] += r["sum_idle"]
+        c["sum_bias"] += r["sum_bias"]
+        c["sum_true"] += r["sum_true"]
+    result = []
+    for city, c in city_data.items():
+        if c["n"] < 3:
+            continue
+        ci       = cities.get(city, default_city)
+        avg_true = c["sum_true"] / c["n"]
+        result.append({
+            "city": city, "tier": ci["tier"],
+            "order_count":      c["n"],
+            "avg_idle_time":    round(c["sum_idle"] / c["n"], 2),
+            "avg_for_bias":     round(c["sum_bias"] / c["n"], 2),
+            "avg_true_kpt":     round(avg_true, 2),
+            "density_index":    ci["density"],
+            "congestion_index": ci["congestion_base"],
+            "rush_index":       round((avg_true/20)*ci["congestion_base"], 3),
+        })
+    result.sort(key=lambda x: x["order_count"], reverse=True)
+    return result
+
+
+def _hourly_patterns(buckets):
+    by_hour = {b["_id"]: b for b in buckets if b["_id"] != "other"}
+    result = []
+    for h in range(24):
+        b = by_hour.get(h)
+        if not b or not b["n"]:
+            result.append({"hour":h,"hour_label":f"{h:02d}:00","order_count":0,"avg_kpt":0,"avg_bias":0,"avg_idle":0,"is_peak":False})
+        else:
+            result.append({
+                "hour": h, "hour_label": f"{h:02d}:00",
+                "order_count": b["n"],
+                "avg_kpt":     round(b["sum_kpt"]  / b["n"], 2),
+                "avg_bias":    round(b["sum_bias"] / b["n"], 2),
+                "avg_idle":    round(b["sum_idle"] / b["n"], 2),
+                "is_peak":     h in PEAK_HOURS,
+            })
+    return result
+
+
+def _rush_index(rows, restaurant_map):
+    ri = []
+    for r in rows:
+        off_n = r["n"] - r["peak_n"]
+        if r["peak_n"] and off_n:
+            pa = r["peak_sum_true"] / r["peak_n"]
+            oa = (r["sum_true"] - r["peak_sum_true"]) / off_n
+            rr = pa / max(oa, 1)
+            rid = r["_id"]
+            ri.append({
+                "restaurant_id":   rid,
+                "restaurant_name": restaurant_map.get(rid,{}).get("restaurant_name","Unknown"),
+                "city":            restaurant_map.get(rid,{}).get("city","Unknown"),
+                "peak_kpt":        round(pa, 1),
+                "off_peak_kpt":    round(oa, 1),
+                "rush_multiplier": round(rr, 2),
+                "load_spike":      round((rr-1)*100, 1),
+            })
+    ri.sort(key=lambda x: x["rush_multiplier"], reverse=True)
+    return ri[:15]
+
+
+def run_pushdown_analytics(manager, restaurant_map, cities, default_city, collection="kpt-data"):
+    """Run both pipelines and shape their results like the in-process rollups"""
+    rows    = manager.aggregate(collection, _restaurant_pipeline(), name=f"{collection}.pushdown.restaurants")
+    buckets = manager.aggregate(collection, _hourly_pipeline(),     name=f"{collection}.pushdown.hourly")
+    return {
+        "restaurant_profiles": _profiles(rows, restaurant_map),
+        "city_analytics":      _city_analytics(rows, restaurant_map, cities, default_city),
+        "hourly_patterns":     _hourly_patterns(buckets),
+        "rush_index":          _rush_index(rows, restaurant_map),
+    }
+
+
+# ── Parity check ──────────────────────────────────────────────
+def _diff(path, expected, actual, tol, out):
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for k in expected.keys() | actual.keys():
+            if k not in expected or k not in actual:
+                out.append(f"{path}.{k}: missing on {'pushdown' if k in expected else 'python'} side")
+            else:
+                _diff(f"{path}.{k}", expected[k], actual[k], tol, out)
+    elif isinstance(expected, bool) or isinstance(actual, bool):
+        if expected != actual:
+            out.append(f"{path}: {expected!r} != {actual!r}")
+    elif isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        if abs(expected - actual) > tol:
+            out.append(f"{path}: {expected} != {actual}")
+    elif expected != actual:
+        out.append(f"{path}: {expected!r} != {actual!r}")
+
+
+def check_parity(python_results, pushdown_results, tol=0.11):
+    """
+    Compare in-process and pushdown outputs. Values are compared after the
+    endpoints' own rounding, so a tolerance of one rounding step is allowed.
+    Returns a list of human-readable mismatches (empty == parity).
+    """
+    keyed = {
+        "restaurant_profiles": None,
+        "city_analytics":      "city",
+        "hourly_patterns":     "hour",
+        "rush_index":          "restaurant_id",
+    }
+    mismatches = []
+    for name, key in keyed.items():
+        exp, act = python_results[name], pushdown_results[name]
+        if key:
+            exp = {row[key]: row for row in exp}
+            act = {row[key]: row for row in act}
+        _diff(name, exp, act, tol, mismatches)
+    return mismatches